@@ -2,12 +2,15 @@
 # app.py
 import time
 import os
+from collections import deque
+from html import escape
+from itertools import islice
+from math import radians, cos, sin, asin, sqrt
 from typing import List, Dict
-from collections import defaultdict
 
 import streamlit as st
 
-from utils. supabase_client import get_supabase
+from utils.supabase_client import get_supabase, execute_with_retry
 from utils.helpers import (
     normalize_product, prettify_product, parse_coord,
     confidence_label, confidence_class,
@@ -23,20 +26,21 @@ from utils.geolocation import set_location_from_gps
 # =========================
 st.set_page_config(page_title="Precios Cercanos", layout="wide")
 
-# Cargar CSS externo (styles.css)
-css_path = os.path.join(os.path.dirname(__file__), "styles.css")
-try:
-    if os.path.exists(css_path):
-        with open(css_path, "r", encoding="utf-8") as f:
-            st.markdown(f"<style>{f.read()}</style>", unsafe_allow_html=True)
-    else:
+@st.cache_resource
+def load_text(*paths: str) -> str:
+    """Lee el primer archivo existente de `paths` una sola vez por proceso (ni stat ni lectura en cada rerun)."""
+    for path in paths:
         try:
-            with open("styles.css", "r", encoding="utf-8") as f:
-                st.markdown(f"<style>{f.read()}</style>", unsafe_allow_html=True)
-        except:
-            pass
-except Exception as e:
-    pass
+            with open(path, "r", encoding="utf-8") as f:
+                return f.read()
+        except OSError:
+            continue
+    return ""
+
+# Cargar CSS externo (styles.css)
+css = load_text(os.path.join(os.path.dirname(__file__), "styles.css"), "styles.css")
+if css:
+    st.markdown(f"<style>{css}</style>", unsafe_allow_html=True)
 
 # Conexión a Supabase
 supabase = get_supabase()
@@ -44,19 +48,67 @@ supabase = get_supabase()
 # =========================
 # Estado de sesión (inicial)
 # =========================
-st. session_state. setdefault("session", None)
-st.session_state.setdefault("user_email", None)
-st.session_state.setdefault("auth_msg", None)
+SESSION_DEFAULTS = {
+    "session": None,
+    "user_email": None,
+    # Se resuelve una vez al validar el OTP (session.user.id)
+    "user_id": None,
+    "auth_msg": None,
+    # Navegación
+    "nav": "Login",
+    # Realtime (polling local)
+    "notif_auto": True,
+    "last_notif_id": 0,
+    # Backoff del polling: próxima consulta (epoch) y espera actual en segundos
+    "notif_next_poll": 0.0,
+    "notif_wait": 5,
+    # Resultado de la última consulta: se muestra también en los ticks que no consultan
+    "notif_status": "",
+    # Solo los últimos 200 logs: la sesión puede durar horas
+    "logs": deque(maxlen=200),
+    "otp_last_send": 0.0,
+    # Ubicación canónica compartida por todas las páginas (texto, como en los inputs)
+    "loc": {"lat": "", "lon": ""},
+    # id → (lat, lon) de los locales creados en la sesión, para no releerlos al registrar precio
+    "store_coords": {},
+}
+
+def init_session_state():
+    for k, v in SESSION_DEFAULTS.items():
+        # copia de listas/dicts/deques para no compartir el mismo objeto entre sesiones
+        st.session_state.setdefault(k, v.copy() if isinstance(v, (list, dict, deque)) else v)
+    st.session_state["_inited"] = True
+
+# Solo la primera ejecución de la sesión inicializa; los reruns hacen un único lookup
+if not st.session_state.get("_inited"):
+    init_session_state()
 
-# Navegación
 SECCIONES_BASE = ["Login", "Cargar Precio", "Lista de Precios", "Alertas", "🗺️ Explorador de Comercios", "📍 Gestión de Locales"]
-st.session_state. setdefault("nav", "Login")
 
-# Realtime (polling local)
-st.session_state.setdefault("notif_auto", True)
-st.session_state.setdefault("last_notif_id", 0)
-st.session_state.setdefault("logs", [])
-st.session_state.setdefault("otp_last_send", 0.0)
+# Catálogos fijos (constantes de módulo: no se reconstruyen en cada rerun)
+# Categorías OSM (key, value) para las sugerencias de Cargar Precio y Gestión de Locales
+OSM_CATEGORIES = {
+    "🏪 Supermercados": ("shop", "supermarket"),
+    "🏬 Almacenes": ("shop", "convenience"),
+    "💊 Farmacias": ("amenity", "pharmacy"),
+    "🥕 Verdulerías": ("shop", "greengrocer"),
+    "🍞 Panaderías": ("shop", "bakery"),
+    "🛍️ Kioscos": ("shop", "kiosk"),
+    "🥩 Carnicerías": ("shop", "butcher"),
+    "📚 Librerías": ("shop", "books"),
+    "🔨 Ferreterías": ("shop", "hardware"),
+}
+
+# Tipos de comercio del Explorador: las categorías OSM más gastronomía/servicios
+COMMERCE_TYPES = {
+    **OSM_CATEGORIES,
+    "☕ Cafeterías": ("amenity", "cafe"),
+    "🍕 Pizzerías": ("amenity", "restaurant"),
+    "💄 Peluquerías": ("shop", "hairdresser"),
+}
+
+# Etiqueta visible → order_mode de la RPC nearby_price_entries
+ORDER_MODES = {"Fecha (reciente)": "fecha", "Precio ascendente": "precio_asc", "Precio descendente": "precio_desc"}
 
 # =========================
 # Helpers de sesión/seguridad
@@ -65,19 +117,35 @@ def add_log(level:  str, msg: str):
     st.session_state.logs.append({"level": level, "msg": msg, "ts": time.strftime("%Y-%m-%d %H:%M:%S")})
 
 def get_user_id():
-    sess = st.session_state. get("session")
-    return getattr(getattr(sess, "user", None), "id", None)
+    return st.session_state.get("user_id")
+
+@st.cache_data(ttl=300, show_spinner=False)
+def _is_admin_cached(uid: str) -> bool:
+    # Sin try/except: un error de red no debe quedar cacheado como "no admin"
+    # HEAD + count: PostgREST responde solo con el conteo, sin cuerpo JSON que parsear
+    res = execute_with_retry(supabase.table("admins").select("user_id", count="exact", head=True).eq("user_id", uid))
+    return (res.count or 0) > 0
 
 def is_admin() -> bool:
     uid = get_user_id()
     if not uid:
         return False
     try:
-        row = supabase.table("admins").select("user_id").eq("user_id", uid).limit(1).execute()
-        return bool(row. data)
+        return _is_admin_cached(uid)
     except Exception: 
         return False
 
+def refresh_sections():
+    """Recalcula las secciones del menú al iniciar/cerrar sesión (o mientras no se hayan podido calcular)."""
+    uid = get_user_id()
+    try:
+        admin = bool(uid) and _is_admin_cached(uid)
+    except Exception:
+        # Falla transitoria: no se fija el menú, así se vuelve a intentar en el próximo rerun
+        st.session_state.pop("sections", None)
+        return
+    st.session_state["sections"] = SECCIONES_BASE + (["Admin"] if admin else [])
+
 def require_auth() -> bool:
     if not (st.session_state.session and get_user_id()):
         st.session_state.auth_msg = "Tu sesión no está activa.   Iniciá sesión para continuar."
@@ -92,15 +160,130 @@ def sync_location_to_query_params(lat_txt:  str, lon_txt: str):
         lat = parse_coord(lat_txt)
         lon = parse_coord(lon_txt)
         if lat is not None and lon is not None: 
-            st.query_params.lat = str(lat)
-            st.query_params.lon = str(lon)
+            # Escribir solo si cambió: cada asignación actualiza la URL en el navegador
+            new = {"lat": str(lat), "lon": str(lon)}
+            st.session_state["loc"].update(new)
+            changed = {k: v for k, v in new.items() if st.query_params.get(k) != v}
+            if changed:
+                st.query_params.update(changed)
     except Exception: 
         pass
 
+def upsert_product_id(name: str, currency: str) -> int:
+    """Crea u obtiene el producto en un solo viaje (RPC upsert_product) y devuelve su id."""
+    res = execute_with_retry(supabase.rpc("upsert_product", {"p_name": name, "p_currency": currency}))
+    product_id = res.data[0]["id"] if res.data else None
+    if not product_id:
+        raise RuntimeError("upsert_product no devolvió id")
+    return product_id
+
+def insert_stores_bulk(places: List[Dict]) -> int:
+    """Crea varios locales en un solo viaje (RPC insert_stores) y devuelve cuántos se insertaron."""
+    rows = [
+        {"name": p["name"], "address": p["address"], "lat": float(p["lat"]), "lon": float(p["lon"])}
+        for p in places
+    ]
+    res = execute_with_retry(supabase.rpc("insert_stores", {"p_rows": rows}), idempotent=False)
+    fetch_nearby_stores.clear()
+    return len(res.data or [])
+
+# =========================
+# Lecturas cacheadas (Supabase)
+# =========================
+# Decimales con que se redondean lat/lon antes de usarlas como clave de caché (~10 m)
+COORD_DECIMALS = 4
+# Tope de combinaciones (ubicación, radio, filtros) guardadas por función: la caché es global a todas las sesiones
+CACHE_MAX_ENTRIES = 256
+
+@st.cache_data(ttl=300, max_entries=CACHE_MAX_ENTRIES, show_spinner=False)
+def fetch_nearby_stores(lat: float, lon: float, radius_km: float, filter_text: str = "") -> List[Dict]:
+    """Locales dentro del radio (RPC nearby_stores), opcionalmente filtrados por nombre/dirección. Se cachea para no repetir la consulta en cada rerun."""
+    params = {"lat": lat, "lon": lon, "radius_km": radius_km}
+    # filter_text solo si hay filtro: sin él, la llamada sigue resolviendo contra la firma vieja de 3 argumentos
+    if filter_text:
+        params["filter_text"] = filter_text
+    return execute_with_retry(supabase.rpc("nearby_stores", params)).data or []
+
+class _NoPlaces(Exception):
+    """Ningún proveedor devolvió comercios (o fallaron: ambos tragan sus errores y devuelven [])."""
+
+@st.cache_data(ttl=600, max_entries=CACHE_MAX_ENTRIES, show_spinner=False)
+def _fetch_places_cached(lat: float, lon: float, radius_m: int, key: str, value: str) -> List[Dict]:
+    # Sin resultados se lanza en vez de devolver []: un 429/timeout no debe quedar cacheado como "no hay nada"
+    places = places_nearby_osm(lat, lon, radius_m, key=key, value=value)
+    if not places:
+        places = places_nearby_google(lat, lon, radius_m, place_type=value)
+    if not places:
+        raise _NoPlaces
+    return places
+
+def fetch_places(lat: float, lon: float, radius_m: int, key: str, value: str) -> List[Dict]:
+    """Comercios cercanos de OSM (Overpass) con Google Places como respaldo; solo se cachean las respuestas con resultados."""
+    try:
+        return _fetch_places_cached(lat, lon, radius_m, key, value)
+    except _NoPlaces:
+        return []
+
+def fetch_price_entries(lat: float, lon: float, radius_km: float, filter_text: str, order_mode: str, max_rows: int) -> List[Dict]:
+    """Último precio por producto/local cercano (RPC nearby_price_entries). Sin caché propia: la cachea price_cards_markdown."""
+    return execute_with_retry(supabase.rpc(
+        "nearby_price_entries",
+        {
+            "lat": lat, "lon": lon, "radius_km": radius_km,
+            "filter_text": filter_text, "order_mode": order_mode, "max_rows": max_rows,
+        },
+    )).data or []
+
+# Tope del historial de notificaciones que se muestra en Alertas
+MAX_NOTIFICATIONS = 50
+
+@st.cache_data(ttl=10, show_spinner=False)
+def fetch_notifications(user_id: str) -> List[Dict]:
+    """Últimas MAX_NOTIFICATIONS notificaciones del usuario; el polling la invalida al llegar una nueva."""
+    return execute_with_retry(
+        supabase.table("notifications").select("id, sighting_id, created_at")
+        .eq("user_id", user_id).order("created_at", desc=True).limit(MAX_NOTIFICATIONS)
+    ).data or []
+
+@st.cache_data(ttl=60, show_spinner=False)
+def fetch_settings() -> Dict | None:
+    """Parámetros de validación (fila settings id=1) o None si no existe. Se invalida al actualizarlos."""
+    res = execute_with_retry(
+        supabase.table("settings").select(
+            "validation_price_tolerance_pct, validation_window_days, validation_min_matches"
+        ).eq("id", 1).maybe_single()
+    )
+    return res.data if res else None
+
+@st.cache_data(ttl=30, max_entries=CACHE_MAX_ENTRIES, show_spinner=False)
+def price_cards_markdown(lat: float, lon: float, radius_km: float, filter_text: str, order_mode: str, max_rows: int) -> str:
+    """Markdown de las tarjetas de "Lista de Precios" para una consulta; "" si no hay filas.
+
+    Única caché de la consulta: en reruns que no la cambian (p. ej. al tocar otros widgets)
+    no se repite la RPC ni se reformatea el HTML.
+    """
+    rows = fetch_price_entries(lat, lon, radius_km, filter_text, order_mode, max_rows)
+    # Un mismo producto aparece en varios locales: embellecer cada nombre una sola vez
+    pretty_names = {name: prettify_product(name) for name in {r["product_name"] for r in rows}}
+    cards = []
+    for r in rows:
+        count = r["count"]
+        meters_str = f"{int(r['meters'])} m" if r.get("meters") is not None else ""
+        # Nombres de producto/local los cargan usuarios: escapar antes de inyectar HTML
+        cards.append(
+            f'<div class="block"><h4>{escape(pretty_names[r["product_name"]])} — {escape(r["store_name"])} {meters_str}</h4>'
+            f'<div>Precio: <strong>{r["latest_price"]}</strong> {escape(r["currency"] or "")}</div>'
+            f'<span class="confidence-tag {confidence_class(count)}">{confidence_label(count)}</span><br/>'
+            f'<span class="small-muted">Última actualización: {r["latest_date"]}</span></div>'
+        )
+    return "\n".join(cards)
+
 # =========================
 # Sidebar + navegación
 # =========================
-SECCIONES = SECCIONES_BASE + (["Admin"] if is_admin() else [])
+if "sections" not in st.session_state:
+    refresh_sections()
+SECCIONES = st.session_state.get("sections", SECCIONES_BASE)
 st.sidebar.title("🧭 Navegación")
 page = st.sidebar.radio("Secciones", SECCIONES, index=SECCIONES.index(st. session_state["nav"]))
 
@@ -113,13 +296,40 @@ if st.session_state.session:
             add_log("INFO", "Sign out OK")
         except Exception as e: 
             add_log("ERROR", f"Sign out:   {e}")
+        _is_admin_cached.clear()
         st.session_state.session = None
         st.session_state.user_email = None
+        st.session_state.user_id = None
+        refresh_sections()
         st. session_state.nav = "Login"
         st. rerun()
 
-# Modo debug solo si sos admin
-if is_admin():
+# Ubicación compartida: un solo botón GPS en la sidebar para la página actual.
+# Corre antes de que la página cree sus widgets, así puede escribir sus claves lat/lon.
+PAGE_COORD_KEYS = {
+    "Cargar Precio": ("lat_txt", "lon_txt"),
+    "Lista de Precios": ("lat_txt_lp", "lon_txt_lp"),
+    "🗺️ Explorador de Comercios": ("lat_txt_explorer", "lon_txt_explorer"),
+    "📍 Gestión de Locales": ("lat_txt_loc", "lon_txt_loc"),
+}
+coord_keys = PAGE_COORD_KEYS.get(page)
+if coord_keys:
+    lat_key, lon_key = coord_keys
+    # La última ubicación usada precarga los campos al cambiar de sección; los query params
+    # solo se leen una vez, para restaurarla al abrir un link o recargar la página
+    loc = st.session_state["loc"]
+    if not loc["lat"]:
+        loc["lat"], loc["lon"] = st.query_params.get("lat", ""), st.query_params.get("lon", "")
+    if loc["lat"] and loc["lon"]:
+        st.session_state.setdefault(lat_key, loc["lat"])
+        st.session_state.setdefault(lon_key, loc["lon"])
+    with st.sidebar:
+        if st.button("📍 Usar mi ubicación actual (GPS)", key="gps_sidebar", use_container_width=True):
+            set_location_from_gps(lat_key, lon_key)
+        st.caption("Haz clic para obtener tu ubicación automáticamente del navegador.")
+
+# Modo debug solo si sos admin ("Admin" en el menú ya refleja is_admin())
+if "Admin" in SECCIONES:
     st.sidebar.checkbox("🧪 Modo debug", key="debug", value=False)
     if st.session_state.debug:
         with st.sidebar.expander("⚙️ Diagnóstico", expanded=True):
@@ -142,7 +352,7 @@ if is_admin():
 
         if st.session_state.logs:
             with st.sidebar.expander("📋 Logs recientes", expanded=False):
-                for entry in reversed(st.session_state.logs[-30:]):
+                for entry in islice(reversed(st.session_state.logs), 30):
                     st.write(f"[{entry['ts']}] {entry['level']}: {entry['msg']}")
         else:
             st.sidebar.caption("Sin logs aún")
@@ -170,8 +380,11 @@ if page == "Login":
                 st.rerun()
         with col2:
             if st.button("Cerrar sesión y usar otra", use_container_width=True):
+                _is_admin_cached.clear()
                 st.session_state.session = None
                 st.session_state. user_email = None
+                st.session_state.user_id = None
+                refresh_sections()
                 st.rerun()
         st.stop()
 
@@ -198,10 +411,25 @@ if page == "Login":
                 st.error("Email inválido.")
             else:
                 try:
-                    supabase.auth.sign_in_with_otp({"email": email})
-                    st.session_state.otp_last_send = time. time()
-                    st.info("✅ Código enviado.   Revisá tu email.")
-                    add_log("INFO", f"OTP enviado a {email}")
+                    # El cooldown real lo lleva la BD por email; el de session_state solo deshabilita el botón.
+                    # idempotent=False: reintentar un turno ya reclamado lo mostraría como "esperá"
+                    wait = execute_with_retry(supabase.rpc("claim_otp_slot", {"p_email": email}), idempotent=False).data or 0
+                    if wait > 0:
+                        st.session_state.otp_last_send = time.time() - (COOLDOWN_SEC - wait)
+                        st.warning(f"Ya enviamos un código a ese email. Esperá {wait}s para pedir otro.")
+                    else:
+                        try:
+                            supabase.auth.sign_in_with_otp({"email": email})
+                        except Exception:
+                            # No salió ningún código: liberamos el turno para que pueda reintentar ya
+                            try:
+                                execute_with_retry(supabase.rpc("release_otp_slot", {"p_email": email}))
+                            except Exception as rel_err:
+                                add_log("ERROR", f"Liberar turno OTP: {rel_err}")
+                            raise
+                        st.session_state.otp_last_send = time. time()
+                        st.info("✅ Código enviado.   Revisá tu email.")
+                        add_log("INFO", f"OTP enviado a {email}")
                 except Exception as e:
                     st.error(f"No pudimos enviar el OTP: {e}")
                     add_log("ERROR", f"Enviar OTP:   {e}")
@@ -211,6 +439,8 @@ if page == "Login":
             session = supabase.auth.verify_otp({"email": email, "token": otp, "type": "email"})
             st.session_state.session = session
             st.session_state.user_email = email
+            st.session_state.user_id = getattr(getattr(session, "user", None), "id", None)
+            refresh_sections()
             st.success("¡Listo! Sesión iniciada (24 horas).")
             add_log("INFO", f"Login OK:  {email}")
             st.session_state["nav"] = "Cargar Precio"
@@ -230,26 +460,22 @@ elif page == "Cargar Precio":
     st.title("🛒 Registrar precio")
 
     st.subheader("Tu ubicación")
-    col_lat, col_lon, col_unit, col_rad = st.columns([1, 1, 0.8, 1.2])
-    
-    # Sin value= para permitir edición libre
-    lat_txt = col_lat.text_input("Latitud", key="lat_txt", placeholder="-38.7183")
-    lon_txt = col_lon.text_input("Longitud", key="lon_txt", placeholder="-62.2663")
-    unit = col_unit.selectbox("Unidad de radio", ["Kilómetros", "Metros"], index=0)
-    if unit == "Kilómetros":
-        radius_value = col_rad.slider("Radio (km)", 1, 15, 5)
-        radius_m = int(radius_value * 1000)
-    else:
-        radius_value = col_rad.slider("Radio (m)", 50, 500, 200, step=50)
-        radius_m = int(radius_value)
-
-    col_gps, col_info = st.columns([2, 3])
-    with col_gps:
-        if st.button("📍 Usar mi ubicación actual (GPS)", key="gps_main", use_container_width=True):
-            set_location_from_gps("lat_txt", "lon_txt")
-
-    with col_info:
-        st.caption("Haz clic para obtener tu ubicación automáticamente del navegador.")
+    # La unidad queda fuera del form porque decide qué slider se muestra
+    unit = st.selectbox("Unidad de radio", ["Kilómetros", "Metros"], index=0)
+
+    # Form: editar lat/lon/radio no dispara reruns ni búsquedas hasta confirmar
+    with st.form("location_form"):
+        col_lat, col_lon, col_rad = st.columns([1, 1, 1.2])
+        # Sin value= para permitir edición libre
+        lat_txt = col_lat.text_input("Latitud", key="lat_txt", placeholder="-38.7183")
+        lon_txt = col_lon.text_input("Longitud", key="lon_txt", placeholder="-62.2663")
+        if unit == "Kilómetros":
+            radius_value = col_rad.slider("Radio (km)", 1, 15, 5)
+            radius_m = int(radius_value * 1000)
+        else:
+            radius_value = col_rad.slider("Radio (m)", 50, 500, 200, step=50)
+            radius_m = int(radius_value)
+        st.form_submit_button("Aplicar ubicación")
 
     sync_location_to_query_params(lat_txt, lon_txt)
 
@@ -260,31 +486,15 @@ elif page == "Cargar Precio":
     store_choice = None
     if lat is not None and lon is not None: 
         try:
-            res = supabase.rpc(
-                "nearby_stores",
-                {"lat": float(lat), "lon": float(lon), "radius_km": float(radius_m) / 1000.0}
-            ).execute()
-            nearby_options = res.data or []
+            nearby_options = fetch_nearby_stores(round(lat, COORD_DECIMALS), round(lon, COORD_DECIMALS), radius_m / 1000.0)
         except Exception as e: 
             st.info("Aún no hay locales cercanos o hubo un error con la búsqueda.")
             add_log("ERROR", f"nearby_stores: {e}")
 
     st.subheader("Local")
 
-    OSM_CATEGORIES = {
-        "🏪 Supermercados": ("shop", "supermarket"),
-        "🏬 Almacenes": ("shop", "convenience"),
-        "💊 Farmacias": ("amenity", "pharmacy"),
-        "🥕 Verdulerías": ("shop", "greengrocer"),
-        "🍞 Panaderías": ("shop", "bakery"),
-        "🛍️ Kioscos": ("shop", "kiosk"),
-        "🥩 Carnicerías": ("shop", "butcher"),
-        "📚 Librerías": ("shop", "books"),
-        "🔨 Ferreterías": ("shop", "hardware"),
-    }
-
     with st.expander("🔍 Sugerencias cercanas (OSM/Google)", expanded=False):
-        osm_choice = st.selectbox("Categoría", list(OSM_CATEGORIES. keys()), key="osm_choice_cargar")
+        osm_choice = st.selectbox("Categoría", tuple(OSM_CATEGORIES), key="osm_choice_cargar")
         adv_col = st.checkbox("Modo avanzado (key/value OSM)", value=False, key="adv_cargar")
         if adv_col:
             key_adv = st.text_input("OSM key (ej.   shop/amenity)", value="shop", key="key_adv_cargar")
@@ -296,32 +506,34 @@ elif page == "Cargar Precio":
             if lat is None or lon is None:
                 st.error("Definí latitud/longitud (GPS o manual).")
             else:
-                g_places = places_nearby_osm(lat, lon, radius_m, key=key_adv, value=val_adv)
+                st.session_state["last_suggestions"] = fetch_places(lat, lon, radius_m, key_adv, val_adv)
 
-                if not g_places:
-                    g_places = places_nearby_google(lat, lon, radius_m, place_type=val_adv)
-
-                if not g_places:
-                    st.info("No se encontraron sugerencias.")
-                else:
-                    for idx, pl in enumerate(g_places, start=1):
-                        st. write(f"{idx}. **{pl['name']}** — {pl['address']}")
-                        if st.button(f"Agregar este local #{idx}", key=f"add_place_{idx}"):
-                            try:
-                                ins = supabase.rpc(
-                                    "insert_store",
-                                    {"p_name": pl["name"], "p_address": pl["address"], "p_lat": float(pl["lat"]), "p_lon": float(pl["lon"])}
-                                ).execute()
-                                store_choice = (ins.data or [{}])[0].get("id")
-                                st.session_state["store_choice"] = store_choice
-                                st.success("Local agregado y seleccionado.")
-                            except Exception as e:
-                                st.error(f"No se pudo crear el local: {e}")
-                                add_log("ERROR", f"Insert store (sugerencia): {e}")
+        # El clic en "Agregar este local #N" hace rerun sin el botón de búsqueda: mostrar lo guardado
+        g_places = st.session_state.get("last_suggestions")
+        if g_places is not None:
+            if not g_places:
+                st.info("No se encontraron sugerencias.")
+            else:
+                for idx, pl in enumerate(g_places, start=1):
+                    st. write(f"{idx}. **{pl['name']}** — {pl['address']}")
+                    if st.button(f"Agregar este local #{idx}", key=f"add_place_{idx}"):
+                        try:
+                            ins = execute_with_retry(supabase.rpc(
+                                "insert_store",
+                                {"p_name": pl["name"], "p_address": pl["address"], "p_lat": float(pl["lat"]), "p_lon": float(pl["lon"])}
+                            ), idempotent=False)
+                            fetch_nearby_stores.clear()
+                            store_choice = (ins.data or [{}])[0].get("id")
+                            st.session_state["store_choice"] = store_choice
+                            st.session_state["store_coords"][store_choice] = (float(pl["lat"]), float(pl["lon"]))
+                            st.success("Local agregado y seleccionado.")
+                        except Exception as e:
+                            st.error(f"No se pudo crear el local: {e}")
+                            add_log("ERROR", f"Insert store (sugerencia): {e}")
 
     if nearby_options:
         labels = {s["id"]: f"{s['name']} ({int(s['meters'])} m)" for s in nearby_options}
-        ids = list(labels.keys())
+        ids = tuple(labels)
         selected_id = st.selectbox("Elegí un local cercano", ids, format_func=lambda x: labels[x])
         store_choice = selected_id
     else:
@@ -342,12 +554,14 @@ elif page == "Cargar Precio":
                         st.error("No se pudo geocodificar la dirección.   Intenta con Ingresar coordenadas.")
                     else:
                         try:
-                            ins = supabase.rpc(
+                            ins = execute_with_retry(supabase.rpc(
                                 "insert_store",
                                 {"p_name":  new_store_name_a, "p_address": new_store_address_a, "p_lat": float(g_lat), "p_lon": float(g_lon)}
-                            ).execute()
+                            ), idempotent=False)
+                            fetch_nearby_stores.clear()
                             store_choice = (ins. data or [{}])[0].get("id")
                             st.session_state["store_choice"] = store_choice
+                            st.session_state["store_coords"][store_choice] = (float(g_lat), float(g_lon))
                             st.success(f"✅ Local creado:   {new_store_name_a}")
                             st.write(f"📍 Coordenadas: {g_lat:.6f}, {g_lon:.6f}")
                         except Exception as e:
@@ -370,23 +584,27 @@ elif page == "Cargar Precio":
                         st.error("Ingresá latitud y longitud válidas.")
                     else:
                         try:
-                            ins = supabase.rpc(
+                            ins = execute_with_retry(supabase.rpc(
                                 "insert_store",
                                 {"p_name":  new_store_name, "p_address": new_store_address, "p_lat": float(lat_n), "p_lon": float(lon_n)}
-                            ).execute()
+                            ), idempotent=False)
+                            fetch_nearby_stores.clear()
                             store_choice = (ins.data or [{}])[0].get("id")
                             st. session_state["store_choice"] = store_choice
+                            st.session_state["store_coords"][store_choice] = (float(lat_n), float(lon_n))
                             st.success(f"✅ Local creado:  {new_store_name}")
                         except Exception as e:
                             st.error(f"No se pudo crear el local: {e}")
                             add_log("ERROR", f"Insert store (manual): {e}")
 
     st.subheader("Producto y precio")
-    product_name_input = st.text_input("Nombre del producto")
-    price = st.number_input("Precio", min_value=0.0, step=0.01, format="%.2f")
-    currency = st.selectbox("Moneda", ["ARS", "USD", "EUR"])
+    with st.form("price_form"):
+        product_name_input = st.text_input("Nombre del producto")
+        price = st.number_input("Precio", min_value=0.0, step=0.01, format="%.2f")
+        currency = st.selectbox("Moneda", ["ARS", "USD", "EUR"])
+        submitted = st.form_submit_button("Registrar precio")
 
-    if st.button("Registrar precio"):
+    if submitted:
         if not product_name_input: 
             st.error("Ingresá el nombre del producto.")
             st.stop()
@@ -401,9 +619,12 @@ elif page == "Cargar Precio":
         lat = parse_coord(lat_txt)
         lon = parse_coord(lon_txt)
 
-        if lat is None or lon is None: 
+        if (lat is None or lon is None) and store_choice in st.session_state["store_coords"]:
+            # Local creado en esta sesión: sus coordenadas ya se conocen, sin ir a la BD
+            lat, lon = st.session_state["store_coords"][store_choice]
+        elif lat is None or lon is None: 
             try:
-                srow = supabase.table("stores").select("id, lat, lon").eq("id", store_choice).single().execute()
+                srow = execute_with_retry(supabase.table("stores").select("lat, lon").eq("id", store_choice).single())
                 lat = srow.data["lat"]
                 lon = srow.data["lon"]
             except Exception: 
@@ -419,17 +640,14 @@ elif page == "Cargar Precio":
         product_name = normalize_product(product_name_input)
 
         try:
-            pid_res = supabase.rpc("upsert_product", {"p_name": product_name, "p_currency": currency}).execute()
-            product_id = pid_res.data[0]["id"] if pid_res.data else None
-            if not product_id:
-                raise RuntimeError("upsert_product no devolvió id")
+            product_id = upsert_product_id(product_name, currency)
         except Exception as e:
             st.error(f"No se pudo crear/obtener el producto: {e}")
             add_log("ERROR", f"upsert_product: {e}")
             st.stop()
 
         try:
-            supabase.table("sightings").insert(
+            execute_with_retry(supabase.table("sightings").insert(
                 {
                     "user_id":  user_id,
                     "product_id": product_id,
@@ -438,7 +656,8 @@ elif page == "Cargar Precio":
                     "lat": float(lat),
                     "lon": float(lon),
                 }
-            ).execute()
+            ), idempotent=False)
+            price_cards_markdown.clear()
             st.success("✅ Precio registrado.   ¡Gracias por tu aporte!")
         except Exception as e:
             st.error(f"Error al registrar el precio: {e}")
@@ -450,29 +669,27 @@ elif page == "Cargar Precio":
 elif page == "Lista de Precios":
     st.title("📋 Precios cercanos")
 
-    col_lat, col_lon, col_unit, col_rad = st.columns([1, 1, 0.8, 1.2])
-    lat_txt = col_lat.text_input("Latitud", key="lat_txt_lp", placeholder="-38.7183")
-    lon_txt = col_lon.text_input("Longitud", key="lon_txt_lp", placeholder="-62.2663")
-    unit = col_unit.selectbox("Unidad de radio", ["Kilómetros", "Metros"], index=0, key="unit_lp")
-    if unit == "Kilómetros":
-        radius_value = col_rad.slider("Radio (km)", 1, 15, 5, key="rad_km_lp")
-        radius_m = int(radius_value * 1000)
-    else:
-        radius_value = col_rad.slider("Radio (m)", 50, 500, 200, step=50, key="rad_m_lp")
-        radius_m = int(radius_value)
-
-    col_gps, col_info = st. columns([2, 3])
-    with col_gps:
-        if st.button("📍 Usar mi ubicación actual (GPS)", key="gps_lp", use_container_width=True):
-            set_location_from_gps("lat_txt_lp", "lon_txt_lp")
-    with col_info:
-        st.caption("Haz clic para obtener tu ubicación automáticamente del navegador.")
+    # La unidad queda fuera del form porque decide qué slider se muestra
+    unit = st.selectbox("Unidad de radio", ["Kilómetros", "Metros"], index=0, key="unit_lp")
+
+    # Form: editar lat/lon/radio no dispara reruns ni la RPC hasta confirmar
+    with st.form("location_form_lp"):
+        col_lat, col_lon, col_rad = st.columns([1, 1, 1.2])
+        lat_txt = col_lat.text_input("Latitud", key="lat_txt_lp", placeholder="-38.7183")
+        lon_txt = col_lon.text_input("Longitud", key="lon_txt_lp", placeholder="-62.2663")
+        if unit == "Kilómetros":
+            radius_value = col_rad.slider("Radio (km)", 1, 15, 5, key="rad_km_lp")
+            radius_m = int(radius_value * 1000)
+        else:
+            radius_value = col_rad.slider("Radio (m)", 50, 500, 200, step=50, key="rad_m_lp")
+            radius_m = int(radius_value)
+        st.form_submit_button("Aplicar ubicación")
 
     sync_location_to_query_params(lat_txt, lon_txt)
 
     st.subheader("Filtros y orden")
     filter_text = st.text_input("Filtrar producto", placeholder="Ej.:   leche, yerba, arroz")
-    order_by = st.radio("Ordenar por", ["Fecha (reciente)", "Precio ascendente", "Precio descendente"], horizontal=True)
+    order_by = st.radio("Ordenar por", tuple(ORDER_MODES), horizontal=True)
     max_cards = st.number_input("Máximo de tarjetas a mostrar", min_value=10, max_value=200, value=50, step=10)
 
     lat = parse_coord(lat_txt)
@@ -483,80 +700,24 @@ elif page == "Lista de Precios":
         st.stop()
 
     try:
-        stores = supabase.rpc(
-            "nearby_stores", {"lat": float(lat), "lon": float(lon), "radius_km": float(radius_m) / 1000.0}
-        ).execute().data or []
+        cards_md = price_cards_markdown(
+            round(lat, COORD_DECIMALS), round(lon, COORD_DECIMALS), radius_m / 1000.0,
+            normalize_product(filter_text), ORDER_MODES[order_by], int(max_cards),
+        )
     except Exception as e:
-        st.error(f"Error buscando locales cercanos: {e}")
-        add_log("ERROR", f"nearby_stores: {e}")
-        st.stop()
-
-    if not stores:
-        st.info("No hay locales cerca aún.")
+        st.error(f"Error buscando precios cercanos: {e}")
+        add_log("ERROR", f"nearby_price_entries: {e}")
         st.stop()
 
-    store_ids = [s["id"] for s in stores]
-    sightings = supabase.table("sightings").select(
-        "id, product_id, store_id, price, created_at, is_validated"
-    ).in_("store_id", store_ids).execute().data
-
-    if not sightings: 
-        st.info("Aún no hay precios cargados en estos locales.")
+    if not cards_md:
+        if filter_text:
+            st.info("No hay resultados con los filtros actuales.")
+        else:
+            st.info("Aún no hay precios cargados en locales cercanos.")
         st.stop()
 
-    product_ids = list({s["product_id"] for s in sightings})
-    products = supabase.table("products").select("id, name, currency").in_("id", product_ids).execute().data
-    prod_map = {p["id"]: {"name": p["name"], "currency": p["currency"]} for p in products}
-    store_map = {s["id"]: s for s in stores}
-
-    grouped = defaultdict(list)
-    for s in sightings:
-        grouped[(s["product_id"], s["store_id"])] = grouped. get((s["product_id"], s["store_id"]), []) + [s]
-
-    entries = []
-    for (pid, sid), items in grouped.items():
-        items_sorted = sorted(items, key=lambda x: x["created_at"], reverse=True)
-        latest = items_sorted[0]
-        count = len(items)
-        label = confidence_label(count)
-        css_class = confidence_class(count)
-        prod = prod_map. get(pid, {"name": f"producto {pid}", "currency": "ARS"})
-        store = store_map. get(sid, {"name": f"Local {sid}", "meters": None})
-        display_name = prettify_product(prod["name"])
-        meters_str = f"{int(store['meters'])} m" if store.get("meters") is not None else ""
-        entries.append({
-            "pid": pid, "sid": sid, "display_name": display_name, "raw_name": prod["name"],
-            "currency": prod["currency"], "store_name": store["name"], "meters_str": meters_str,
-            "latest_price": latest["price"], "latest_date": latest["created_at"],
-            "count": count, "label": label, "css_class": css_class,
-        })
-
-    if filter_text:
-        ft_norm = normalize_product(filter_text)
-        ft_lower = filter_text.strip().lower()
-        entries = [e for e in entries if (ft_norm in e["raw_name"]) or (ft_lower in e["display_name"]. lower())]
-
-    if order_by == "Fecha (reciente)":
-        entries.sort(key=lambda e: e["latest_date"], reverse=True)
-    elif order_by == "Precio ascendente":
-        entries.sort(key=lambda e: (e["currency"], float(e["latest_price"])))
-    else: 
-        entries.sort(key=lambda e: (e["currency"], float(e["latest_price"])), reverse=True)
-
-    entries = entries[:max_cards]
-    if not entries:
-        st.info("No hay resultados con los filtros actuales.")
-    else:
-        for e in entries:
-            st.markdown(
-                f"""
-                ###### {e['display_name']} — {e['store_name']} {e['meters_str']}
-                Precio: {e['latest_price']} {e['currency']}
-                <span class="confidence-tag {e['css_class']}">{e['label']}</span><br/>
-                Última actualización: {e['latest_date']}
-                """,
-                unsafe_allow_html=True,
-            )
+    # Un solo st.markdown para todas las tarjetas (un mensaje al navegador en vez de N)
+    st.markdown(cards_md, unsafe_allow_html=True)
 
 # =========================
 # PÁGINA:   EXPLORADOR DE COMERCIOS
@@ -566,43 +727,26 @@ elif page == "🗺️ Explorador de Comercios":
     st.markdown("Descubre comercios cercanos a tu ubicación sin necesidad de cargarlos primero.")
 
     st.subheader("Tu ubicación")
-    col_lat, col_lon, col_unit, col_rad = st.columns([1, 1, 0.8, 1.2])
-    lat_txt = col_lat.text_input("Latitud", key="lat_txt_explorer", placeholder="-38.7183")
-    lon_txt = col_lon.text_input("Longitud", key="lon_txt_explorer", placeholder="-62.2663")
-    unit = col_unit.selectbox("Unidad de radio", ["Kilómetros", "Metros"], index=0, key="unit_explorer")
-    if unit == "Kilómetros":
-        radius_value = col_rad.slider("Radio (km)", 1, 15, 5, key="rad_km_explorer")
-        radius_m = int(radius_value * 1000)
-    else:
-        radius_value = col_rad.slider("Radio (m)", 50, 500, 200, step=50, key="rad_m_explorer")
-        radius_m = int(radius_value)
-
-    col_gps, col_info = st.columns([2, 3])
-    with col_gps:
-        if st.button("📍 Usar mi ubicación actual (GPS)", key="gps_explorer", use_container_width=True):
-            set_location_from_gps("lat_txt_explorer", "lon_txt_explorer")
-    with col_info: 
-        st.caption("Haz clic para obtener tu ubicación automáticamente del navegador.")
+    # La unidad queda fuera del form porque decide qué slider se muestra
+    unit = st.selectbox("Unidad de radio", ["Kilómetros", "Metros"], index=0, key="unit_explorer")
+
+    # Form: editar lat/lon/radio no dispara reruns hasta confirmar
+    with st.form("location_form_explorer"):
+        col_lat, col_lon, col_rad = st.columns([1, 1, 1.2])
+        lat_txt = col_lat.text_input("Latitud", key="lat_txt_explorer", placeholder="-38.7183")
+        lon_txt = col_lon.text_input("Longitud", key="lon_txt_explorer", placeholder="-62.2663")
+        if unit == "Kilómetros":
+            radius_value = col_rad.slider("Radio (km)", 1, 15, 5, key="rad_km_explorer")
+            radius_m = int(radius_value * 1000)
+        else:
+            radius_value = col_rad.slider("Radio (m)", 50, 500, 200, step=50, key="rad_m_explorer")
+            radius_m = int(radius_value)
+        st.form_submit_button("Aplicar ubicación")
 
     sync_location_to_query_params(lat_txt, lon_txt)
 
     st.subheader("Tipo de comercio")
-    COMMERCE_TYPES = {
-        "🏪 Supermercados":  ("shop", "supermarket"),
-        "🏬 Almacenes": ("shop", "convenience"),
-        "💊 Farmacias": ("amenity", "pharmacy"),
-        "🥕 Verdulerías": ("shop", "greengrocer"),
-        "🍞 Panaderías": ("shop", "bakery"),
-        "🛍️ Kioscos": ("shop", "kiosk"),
-        "🥩 Carnicerías": ("shop", "butcher"),
-        "📚 Librerías": ("shop", "books"),
-        "🔨 Ferreterías": ("shop", "hardware"),
-        "☕ Cafeterías": ("amenity", "cafe"),
-        "🍕 Pizzerías": ("amenity", "restaurant"),
-        "💄 Peluquerías": ("shop", "hairdresser"),
-    }
-
-    commerce_choice = st.selectbox("Selecciona el tipo de comercio:", list(COMMERCE_TYPES.keys()), key="commerce_selector")
+    commerce_choice = st.selectbox("Selecciona el tipo de comercio:", tuple(COMMERCE_TYPES), key="commerce_selector")
     key_type, val_type = COMMERCE_TYPES[commerce_choice]
 
     if st.button("🔍 Buscar comercios cercanos", use_container_width=True):
@@ -612,53 +756,70 @@ elif page == "🗺️ Explorador de Comercios":
         if lat is None or lon is None: 
             st.error("❌ Por favor, ingresa tu ubicación (latitud y longitud).")
         else:
-            st.info(f"🔍 Buscando {commerce_choice. lower()} en un radio de {radius_m/1000:. 1f} km...")
+            st.info(f"🔍 Buscando {commerce_choice. lower()} en un radio de {radius_m/1000:.1f} km...")
+            st.session_state["explorer_places"] = {
+                "lat": lat, "lon": lon, "label": commerce_choice,
+                "places": fetch_places(lat, lon, radius_m, key_type, val_type),
+            }
+
+    # Resultados guardados: sobreviven al rerun que dispara "➕ Agregar"
+    found = st.session_state.get("explorer_places")
+    if found:
+        lat, lon, commerce_choice, places = found["lat"], found["lon"], found["label"], found["places"]
+        if not places:
+            st.warning(f"⚠️ No se encontraron {commerce_choice.lower()} cercanos en esta área.   Intenta con un radio más grande o diferente tipo de comercio.")
+            st.info("💡 Tip: Puedes agregar comercios manualmente en la sección 'Gestión de Locales'.")
+        else:
+            st.success(f"✅ Se encontraron {len(places)} {commerce_choice.lower()}:")
+
+            # Importación en lote: un solo RPC en vez de un clic (y un rerun) por local
+            selected = st.multiselect(
+                "Importar varios a la vez", tuple(range(len(places))),
+                format_func=lambda i: f"{i + 1}. {places[i]['name']}", key="bulk_explorer",
+            )
+            if st.button("📥 Importar seleccionados", key="bulk_explorer_btn", disabled=not selected):
+                try:
+                    n = insert_stores_bulk([places[i] for i in selected])
+                    skipped = len(selected) - n
+                    st.success(f"✅ {n} locales agregados a tu base de datos." + (f" {skipped} ya estaban cargados." if skipped else ""))
+                except Exception as e:
+                    st.error(f"❌ Error al importar: {e}")
+                    add_log("ERROR", f"Insert stores (explorer): {e}")
 
-            places = places_nearby_osm(lat, lon, radius_m, key=key_type, value=val_type)
+            for idx, place in enumerate(places, start=1):
+                with st.container(border=True):
+                    col1, col2 = st. columns([3, 1])
 
-            if not places:
-                places = places_nearby_google(lat, lon, radius_m, place_type=val_type)
+                    with col1:
+                        st.subheader(f"{idx}. {place['name']}")
+                        st.write(f"📍 {place['address']}")
 
-            if not places:
-                st.warning(f"⚠️ No se encontraron {commerce_choice.lower()} cercanos en esta área.   Intenta con un radio más grande o diferente tipo de comercio.")
-                st.info("💡 Tip: Puedes agregar comercios manualmente en la sección 'Gestión de Locales'.")
-            else:
-                st.success(f"✅ Se encontraron {len(places)} {commerce_choice.lower()}:")
-
-                for idx, place in enumerate(places, start=1):
-                    with st.container(border=True):
-                        col1, col2 = st. columns([3, 1])
-
-                        with col1:
-                            st.subheader(f"{idx}. {place['name']}")
-                            st.write(f"📍 {place['address']}")
-
-                            from math import radians, cos, sin, asin, sqrt
-                            lon1, lat1, lon2, lat2 = map(radians, [lon, lat, place['lon'], place['lat']])
-                            dlon = lon2 - lon1
-                            dlat = lat2 - lat1
-                            a = sin(dlat/2)**2 + cos(lat1) * cos(lat2) * sin(dlon/2)**2
-                            c = 2 * asin(sqrt(a))
-                            distance_km = 6371 * c
-
-                            st.caption(f"📏 Distancia: {distance_km:.2f} km")
-
-                        with col2:
-                            if st.button(f"➕ Agregar", key=f"add_explorer_{idx}", use_container_width=True):
-                                try:
-                                    ins = supabase.rpc(
-                                        "insert_store",
-                                        {
-                                            "p_name": place["name"],
-                                            "p_address":  place["address"],
-                                            "p_lat": float(place["lat"]),
-                                            "p_lon": float(place["lon"])
-                                        }
-                                    ).execute()
-                                    st. success(f"✅ {place['name']} agregado a tu base de datos.")
-                                except Exception as e: 
-                                    st.error(f"❌ Error al agregar:   {e}")
-                                    add_log("ERROR", f"Insert store (explorer): {e}")
+                        lon1, lat1, lon2, lat2 = map(radians, [lon, lat, place['lon'], place['lat']])
+                        dlon = lon2 - lon1
+                        dlat = lat2 - lat1
+                        a = sin(dlat/2)**2 + cos(lat1) * cos(lat2) * sin(dlon/2)**2
+                        c = 2 * asin(sqrt(a))
+                        distance_km = 6371 * c
+
+                        st.caption(f"📏 Distancia: {distance_km:.2f} km")
+
+                    with col2:
+                        if st.button(f"➕ Agregar", key=f"add_explorer_{idx}", use_container_width=True):
+                            try:
+                                ins = execute_with_retry(supabase.rpc(
+                                    "insert_store",
+                                    {
+                                        "p_name": place["name"],
+                                        "p_address":  place["address"],
+                                        "p_lat": float(place["lat"]),
+                                        "p_lon": float(place["lon"])
+                                    }
+                                ), idempotent=False)
+                                fetch_nearby_stores.clear()
+                                st. success(f"✅ {place['name']} agregado a tu base de datos.")
+                            except Exception as e: 
+                                st.error(f"❌ Error al agregar:   {e}")
+                                add_log("ERROR", f"Insert store (explorer): {e}")
 
 # =========================
 # PÁGINA:  ALERTAS
@@ -670,19 +831,19 @@ elif page == "Alertas":
     st.title("🔔 Alertas de precio")
 
     st.subheader("Crear alerta")
-    product_name_input = st.text_input("Producto")
-    target_price = st.number_input("Alertarme si el precio es menor o igual a…", min_value=0.0, step=0.01, format="%.2f")
-    radius_km = st.slider("Radio de alerta (km)", 1, 20, 5)
-
-    if st.button("Activar alerta"):
+    # Form: editar los campos no reejecuta la página (ni la consulta del historial) hasta enviar
+    with st.form("alert_form"):
+        product_name_input = st.text_input("Producto")
+        target_price = st.number_input("Alertarme si el precio es menor o igual a…", min_value=0.0, step=0.01, format="%.2f")
+        radius_km = st.slider("Radio de alerta (km)", 1, 20, 5)
+        alert_submitted = st.form_submit_button("Activar alerta")
+
+    if alert_submitted:
         try:
             product_name = normalize_product(product_name_input)
-            pid_res = supabase.rpc("upsert_product", {"p_name": product_name, "p_currency": "ARS"}).execute()
-            product_id = pid_res.data[0]["id"] if pid_res.data else None
-            if not product_id:
-                raise RuntimeError("upsert_product no devolvió id")
+            product_id = upsert_product_id(product_name, "ARS")
 
-            supabase.table("alerts").insert(
+            execute_with_retry(supabase.table("alerts").insert(
                 {
                     "user_id": get_user_id(),
                     "product_id": product_id,
@@ -690,7 +851,7 @@ elif page == "Alertas":
                     "radius_km": float(radius_km),
                     "active": True,
                 }
-            ).execute()
+            ), idempotent=False)
             st.success("✅ Alerta creada.")
         except Exception as e: 
             st.error(f"No pudimos crear la alerta: {e}")
@@ -699,38 +860,56 @@ elif page == "Alertas":
     st.subheader("Mis notificaciones")
     user_id = get_user_id()
     try:
-        notes = supabase.table("notifications").select("id, alert_id, sighting_id, created_at").eq("user_id", user_id).order("created_at", desc=True).execute().data
+        notes = fetch_notifications(user_id)
         if not notes: 
             st.info("Todavía no hay notificaciones.")
         else:
             for n in notes:
                 st.write(f"🔔 Notificación #{n['id']} — avistamiento {n['sighting_id']} — {n['created_at']}")
+            # El historial ya está en pantalla: el polling arranca desde el id más nuevo
+            st.session_state["last_notif_id"] = max(st.session_state["last_notif_id"], max(n["id"] for n in notes))
     except Exception as e: 
         st.error(f"Error al cargar notificaciones: {e}")
         add_log("ERROR", f"List notifications: {e}")
 
     st.divider()
-    st.subheader("Notificaciones en tiempo real (polling cada 5s)")
+    st.subheader("Notificaciones en tiempo real (polling adaptativo 5–60s)")
+
+    NOTIF_MAX_WAIT = 60
 
     @st.fragment(run_every="5s")
     def notif_fragment():
-        try:
-            last_id = st.session_state.get("last_notif_id", 0)
-            q = supabase.table("notifications").select("id, sighting_id, created_at").eq("user_id", user_id)
-            if last_id > 0:
-                q = q. gt("id", last_id)
-            rows = q.order("id", desc=False).limit(50).execute().data or []
-            for r in rows:
-                nid = r["id"]
-                sid = r["sighting_id"]
-                created = r["created_at"]
-                st.toast(f"🔔 Nueva notificación #{nid} — avistamiento {sid} — {created}", icon="🔔")
-                if nid > st.session_state["last_notif_id"]: 
-                    st.session_state["last_notif_id"] = nid
-            if not rows:
-                st.caption("Sin notificaciones nuevas por el momento.")
-        except Exception as e:
-            st.warning(f"No se pudo consultar notificaciones: {e}")
+        # El fragmento corre cada 5s, pero solo consulta la BD cuando vence la espera:
+        # sin novedades la espera se duplica hasta NOTIF_MAX_WAIT; al llegar una se vuelve a 5s
+        now = time.time()
+        if now >= st.session_state["notif_next_poll"]:
+            try:
+                # Solo el delta: índice (user_id, id) → consulta constante aunque crezca el historial
+                last_id = st.session_state.get("last_notif_id", 0)
+                rows = execute_with_retry(
+                    supabase.table("notifications").select("id, sighting_id, created_at")
+                    .eq("user_id", user_id).gt("id", last_id)
+                    .order("id", desc=False).limit(50)
+                ).data or []
+                for r in rows:
+                    st.toast(f"🔔 Nueva notificación #{r['id']} — avistamiento {r['sighting_id']} — {r['created_at']}", icon="🔔")
+                if rows:
+                    # Orden ascendente por id: la última fila es la más nueva
+                    st.session_state["last_notif_id"] = rows[-1]["id"]
+                    fetch_notifications.clear()
+                    st.session_state["notif_wait"] = 5
+                    st.session_state["notif_status"] = f"🔔 {len(rows)} notificación(es) nueva(s) a las {time.strftime('%H:%M:%S')}."
+                else:
+                    st.session_state["notif_wait"] = min(st.session_state["notif_wait"] * 2, NOTIF_MAX_WAIT)
+                    st.session_state["notif_status"] = f"Sin notificaciones nuevas (última consulta {time.strftime('%H:%M:%S')})."
+            except Exception as e:
+                st.session_state["notif_status"] = f"⚠️ No se pudo consultar notificaciones: {e}"
+                add_log("ERROR", f"Poll notifications: {e}")
+            st.session_state["notif_next_poll"] = now + st.session_state["notif_wait"]
+
+        # Se dibuja en todos los ticks: si no, el contenido del fragmento desaparece cuando no consulta
+        remaining = max(0, int(st.session_state["notif_next_poll"] - now))
+        st.caption(f"{st.session_state['notif_status']} Próxima consulta en {remaining}s.")
 
     if st.session_state.notif_auto:
         notif_fragment()
@@ -740,6 +919,8 @@ elif page == "Alertas":
     cols_rt = st.columns(3)
     with cols_rt[0]: 
         if st.button("Actualizar ahora"):
+            st.session_state["notif_next_poll"] = 0.0
+            st.session_state["notif_wait"] = 5
             st.rerun()
     with cols_rt[1]: 
         if st.session_state.notif_auto and st.button("Pausar auto-actualización"):
@@ -762,23 +943,21 @@ elif page == "📍 Gestión de Locales":
 
     st.subheader("📂 Mis locales cercanos")
 
-    col_lat, col_lon, col_unit, col_rad = st. columns([1, 1, 0.8, 1.2])
-    lat_txt = col_lat.text_input("Latitud", key="lat_txt_loc", placeholder="-38.7183")
-    lon_txt = col_lon. text_input("Longitud", key="lon_txt_loc", placeholder="-62.2663")
-    unit = col_unit.selectbox("Unidad de radio", ["Kilómetros", "Metros"], index=0, key="unit_loc")
-    if unit == "Kilómetros":
-        radius_value = col_rad.slider("Radio (km)", 1, 15, 5, key="rad_km_loc")
-        radius_m = int(radius_value * 1000)
-    else:
-        radius_value = col_rad.slider("Radio (m)", 50, 500, 200, step=50, key="rad_m_loc")
-        radius_m = int(radius_value)
-
-    col_gps, col_info = st.columns([2, 3])
-    with col_gps:
-        if st.button("📍 Usar mi ubicación actual (GPS)", key="gps_loc", use_container_width=True):
-            set_location_from_gps("lat_txt_loc", "lon_txt_loc")
-    with col_info: 
-        st.caption("Haz clic para obtener tu ubicación automáticamente del navegador.")
+    # La unidad queda fuera del form porque decide qué slider se muestra
+    unit = st.selectbox("Unidad de radio", ["Kilómetros", "Metros"], index=0, key="unit_loc")
+
+    # Form: editar lat/lon/radio no dispara reruns ni la RPC hasta confirmar
+    with st.form("location_form_loc"):
+        col_lat, col_lon, col_rad = st.columns([1, 1, 1.2])
+        lat_txt = col_lat.text_input("Latitud", key="lat_txt_loc", placeholder="-38.7183")
+        lon_txt = col_lon.text_input("Longitud", key="lon_txt_loc", placeholder="-62.2663")
+        if unit == "Kilómetros":
+            radius_value = col_rad.slider("Radio (km)", 1, 15, 5, key="rad_km_loc")
+            radius_m = int(radius_value * 1000)
+        else:
+            radius_value = col_rad.slider("Radio (m)", 50, 500, 200, step=50, key="rad_m_loc")
+            radius_m = int(radius_value)
+        st.form_submit_button("Aplicar ubicación")
 
     sync_location_to_query_params(lat_txt, lon_txt)
 
@@ -792,22 +971,17 @@ elif page == "📍 Gestión de Locales":
         st.info("Definí lat/lon para ver locales cercanos.")
     else:
         try:
-            rows = supabase.rpc(
-                "nearby_stores",
-                {"lat": float(lat), "lon": float(lon), "radius_km": float(radius_m) / 1000.0}
-            ).execute().data or []
+            # El filtro por nombre/dirección lo resuelve nearby_stores: solo llegan las filas que se muestran
+            rows = fetch_nearby_stores(
+                round(lat, COORD_DECIMALS), round(lon, COORD_DECIMALS), radius_m / 1000.0, f_name.strip()
+            )
         except Exception as e:
             rows = []
             st.warning(f"No se pudo consultar locales cercanos: {e}")
 
-        if f_name:
-            term = f_name.strip().lower()
-            rows = [r for r in rows if term in (r. get("name", "") or "").lower() or term in (r.get("address", "") or "").lower()]
-
+        # nearby_stores ya devuelve las filas ORDER BY meters: solo hace falta reordenar por nombre
         if order == "Nombre":
-            rows. sort(key=lambda r: (r.get("name", "") or "").lower())
-        else:
-            rows.sort(key=lambda r: float(r.get("meters") or 0.0))
+            rows.sort(key=lambda r: (r.get("name", "") or "").lower())
 
         if not rows:
             st.info("No hay locales cercanos en tu DB dentro del radio.")
@@ -842,10 +1016,11 @@ elif page == "📍 Gestión de Locales":
                     st.error("❌ No se pudo encontrar esa dirección.   Intenta con 'Coordenadas manuales'.")
                 else:
                     try:
-                        ins = supabase.rpc(
+                        ins = execute_with_retry(supabase.rpc(
                             "insert_store",
                             {"p_name": new_store_name_geo, "p_address":  new_store_address_geo, "p_lat": float(g_lat), "p_lon": float(g_lon)}
-                        ).execute()
+                        ), idempotent=False)
+                        fetch_nearby_stores.clear()
                         st.success(f"✅ Local creado:   **{new_store_name_geo}**")
                         st.write(f"📍 **Coordenadas:** Lat {g_lat:.6f}, Lon {g_lon:.6f}")
                         st.write(f"🔗 [Ver en Google Maps](https://maps.google.com/? q={g_lat},{g_lon})")
@@ -874,10 +1049,11 @@ elif page == "📍 Gestión de Locales":
                     st.error("❌ Ingresá latitud y longitud válidas (números decimales).")
                 else:
                     try:
-                        ins = supabase.rpc(
+                        ins = execute_with_retry(supabase.rpc(
                             "insert_store",
                             {"p_name":  new_store_name_manual, "p_address": new_store_address_manual, "p_lat": float(lat_n), "p_lon": float(lon_n)}
-                        ).execute()
+                        ), idempotent=False)
+                        fetch_nearby_stores.clear()
                         st.success(f"✅ Local creado:  **{new_store_name_manual}**")
                         st.write(f"📍 **Coordenadas:** Lat {lat_n:.6f}, Lon {lon_n:.6f}")
                         st.write(f"🔗 [Ver en Google Maps](https://maps.google.com/?q={lat_n},{lon_n})")
@@ -890,18 +1066,7 @@ elif page == "📍 Gestión de Locales":
     st.subheader("🗺️ Buscar comercios de OpenStreetMap")
     st.markdown("Busca locales por tipo (farmacias, supermercados, etc.) y agrégalos a tu BD.")
 
-    OSM_CATEGORIES = {
-        "🏪 Supermercados": ("shop", "supermarket"),
-        "🏬 Almacenes": ("shop", "convenience"),
-        "💊 Farmacias": ("amenity", "pharmacy"),
-        "🥕 Verdulerías": ("shop", "greengrocer"),
-        "🍞 Panaderías": ("shop", "bakery"),
-        "🛍️ Kioscos": ("shop", "kiosk"),
-        "🥩 Carnicerías": ("shop", "butcher"),
-        "📚 Librerías": ("shop", "books"),
-        "🔨 Ferreterías": ("shop", "hardware"),
-    }
-    osm_choice = st.selectbox("Selecciona tipo de comercio", list(OSM_CATEGORIES.keys()), key="osm_choice_loc_manage")
+    osm_choice = st.selectbox("Selecciona tipo de comercio", tuple(OSM_CATEGORIES), key="osm_choice_loc_manage")
 
     if st.button("🔍 Buscar en OpenStreetMap", use_container_width=True):
         if lat is None or lon is None:
@@ -909,45 +1074,62 @@ elif page == "📍 Gestión de Locales":
         else:
             key_type, val_type = OSM_CATEGORIES[osm_choice]
             st.info(f"🔍 Buscando {osm_choice. lower()} en un radio de {radius_m/1000:.1f} km...")
+            st.session_state["loc_places"] = {
+                "lat": lat, "lon": lon, "label": osm_choice,
+                "places": fetch_places(lat, lon, radius_m, key_type, val_type),
+            }
+
+    # Resultados guardados: sobreviven al rerun que dispara "➕ Agregar"
+    found = st.session_state.get("loc_places")
+    if found:
+        lat, lon, osm_choice, places_osm = found["lat"], found["lon"], found["label"], found["places"]
+        if not places_osm:
+            st.warning(f"⚠️ No se encontraron {osm_choice.lower()} en esta área.")
+        else:
+            st.success(f"✅ Se encontraron {len(places_osm)} {osm_choice.lower()}:")
 
-            places_osm = places_nearby_osm(lat, lon, radius_m, key=key_type, value=val_type)
-
-            if not places_osm: 
-                places_osm = places_nearby_google(lat, lon, radius_m, place_type=val_type)
-
-            if not places_osm:
-                st.warning(f"⚠️ No se encontraron {osm_choice.lower()} en esta área.")
-            else:
-                st.success(f"✅ Se encontraron {len(places_osm)} {osm_choice.lower()}:")
-
-                for idx, place in enumerate(places_osm, start=1):
-                    with st.container(border=True):
-                        col1, col2 = st.columns([3, 1])
-
-                        with col1:
-                            st.write(f"**{idx}.   {place['name']}**")
-                            st.caption(f"📍 {place['address']}")
-
-                            from math import radians, cos, sin, asin, sqrt
-                            lon1, lat1, lon2, lat2 = map(radians, [lon, lat, place['lon'], place['lat']])
-                            dlon = lon2 - lon1
-                            dlat = lat2 - lat1
-                            a = sin(dlat/2)**2 + cos(lat1) * cos(lat2) * sin(dlon/2)**2
-                            c = 2 * asin(sqrt(a))
-                            distance_km = 6371 * c
-                            st.caption(f"📏 Distancia: {distance_km:.2f} km")
-
-                        with col2:
-                            if st.button(f"➕ Agregar", key=f"add_osm_loc_{idx}", use_container_width=True):
-                                try:
-                                    ins = supabase.rpc(
-                                        "insert_store",
-                                        {"p_name": place["name"], "p_address": place["address"], "p_lat": float(place["lat"]), "p_lon": float(place["lon"])}
-                                    ).execute()
-                                    st.success(f"✅ {place['name']} agregado a tu BD.")
-                                except Exception as e:
-                                    st.error(f"❌ Error al agregar:   {e}")
-                                    add_log("ERROR", f"Insert store (osm): {e}")
+            # Importación en lote: un solo RPC en vez de un clic (y un rerun) por local
+            selected = st.multiselect(
+                "Importar varios a la vez", tuple(range(len(places_osm))),
+                format_func=lambda i: f"{i + 1}. {places_osm[i]['name']}", key="bulk_osm_loc",
+            )
+            if st.button("📥 Importar seleccionados", key="bulk_osm_loc_btn", disabled=not selected):
+                try:
+                    n = insert_stores_bulk([places_osm[i] for i in selected])
+                    skipped = len(selected) - n
+                    st.success(f"✅ {n} locales agregados a tu BD." + (f" {skipped} ya estaban cargados." if skipped else ""))
+                except Exception as e:
+                    st.error(f"❌ Error al importar: {e}")
+                    add_log("ERROR", f"Insert stores (osm): {e}")
+
+            for idx, place in enumerate(places_osm, start=1):
+                with st.container(border=True):
+                    col1, col2 = st.columns([3, 1])
+
+                    with col1:
+                        st.write(f"**{idx}.   {place['name']}**")
+                        st.caption(f"📍 {place['address']}")
+
+                        lon1, lat1, lon2, lat2 = map(radians, [lon, lat, place['lon'], place['lat']])
+                        dlon = lon2 - lon1
+                        dlat = lat2 - lat1
+                        a = sin(dlat/2)**2 + cos(lat1) * cos(lat2) * sin(dlon/2)**2
+                        c = 2 * asin(sqrt(a))
+                        distance_km = 6371 * c
+                        st.caption(f"📏 Distancia: {distance_km:.2f} km")
+
+                    with col2:
+                        if st.button(f"➕ Agregar", key=f"add_osm_loc_{idx}", use_container_width=True):
+                            try:
+                                ins = execute_with_retry(supabase.rpc(
+                                    "insert_store",
+                                    {"p_name": place["name"], "p_address": place["address"], "p_lat": float(place["lat"]), "p_lon": float(place["lon"])}
+                                ), idempotent=False)
+                                fetch_nearby_stores.clear()
+                                st.success(f"✅ {place['name']} agregado a tu BD.")
+                            except Exception as e:
+                                st.error(f"❌ Error al agregar:   {e}")
+                                add_log("ERROR", f"Insert store (osm): {e}")
 
 # =========================
 # PÁGINA ADMIN (Settings)
@@ -962,11 +1144,10 @@ elif page == "Admin":
     st.title("⚙️ Panel de configuración (Settings)")
 
     try:
-        rows = supabase.table("settings").select("*").eq("id", 1).execute().data
-        if not rows:
+        current = fetch_settings()
+        if not current:
             st.warning("No existe la fila de settings (id=1). Ejecutá settings_schema.sql.")
             st.stop()
-        current = rows[0]
     except Exception as e:
         st.error(f"No se pudo leer settings:   {e}")
         st.stop()
@@ -991,10 +1172,11 @@ elif page == "Admin":
     st.caption("Para actualizar se requiere permiso de administrador (tabla public. admins).")
     if st.button("Actualizar parámetros"):
         try:
-            supabase.rpc(
+            execute_with_retry(supabase.rpc(
                 "update_settings",
                 {"p_tolerance":  float(tol_pct) / 100.0, "p_window_days": int(win_days), "p_min_matches": int(min_matches)},
-            ).execute()
+            ))
+            fetch_settings.clear()
             st.success("✅ Parámetros actualizados.")
         except Exception as e: 
             st.error(f"No pudimos actualizar los parámetros:  {e}")
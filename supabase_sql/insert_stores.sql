@@ -0,0 +1,30 @@
+-- supabase_sql/insert_stores.sql
+-- Alta en lote de locales sugeridos (OSM/Google) en un solo viaje.
+-- p_rows: arreglo JSON [{"name","address","lat","lon"}, ...].
+-- stores.geom no tiene default ni trigger: se arma acá desde lat/lon, como en insert_store,
+-- para que nearby_stores (ST_DWithin) y el trigger de alertas encuentren los locales nuevos.
+-- stores no tiene restricción única aparte de la PK, así que los repetidos se filtran a mano:
+-- se saltea un local si ya hay otro con el mismo nombre (sin distinguir mayúsculas) a menos de
+-- 10 m, y DISTINCT ON descarta los repetidos dentro del mismo lote. Devuelve solo los insertados.
+CREATE OR REPLACE FUNCTION public.insert_stores(p_rows jsonb)
+RETURNS TABLE(id bigint)
+LANGUAGE sql
+AS $function$
+INSERT INTO public.stores AS s (name, address, lat, lon, geom)
+SELECT DISTINCT ON (lower(n.name), round(n.lat, 4), round(n.lon, 4))
+  n.name, n.address, n.lat, n.lon, n.geom
+FROM (
+  SELECT
+    r->>'name' AS name, coalesce(r->>'address', '') AS address,
+    (r->>'lat')::numeric AS lat, (r->>'lon')::numeric AS lon,
+    ST_SetSRID(ST_MakePoint((r->>'lon')::float8, (r->>'lat')::float8), 4326) AS geom
+  FROM jsonb_array_elements(p_rows) AS r
+) AS n
+WHERE NOT EXISTS (
+  SELECT 1 FROM public.stores s2
+  WHERE lower(s2.name) = lower(n.name)
+    AND ST_DWithin(s2.geom::geography, n.geom::geography, 10)
+)
+ORDER BY lower(n.name), round(n.lat, 4), round(n.lon, 4)
+RETURNING s.id;
+$function$;
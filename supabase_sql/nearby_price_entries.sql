@@ -0,0 +1,83 @@
+-- supabase_sql/nearby_price_entries.sql
+-- Devuelve, en un solo viaje, el último precio por (producto, local) para los
+-- locales dentro del radio, junto con la cantidad de reportes.
+-- Filtro por nombre, orden y límite se resuelven acá para no traer filas de más.
+DROP FUNCTION IF EXISTS public.nearby_price_entries(numeric, numeric, numeric);
+
+CREATE OR REPLACE FUNCTION public.nearby_price_entries(
+  lat numeric,
+  lon numeric,
+  radius_km numeric,
+  filter_text text DEFAULT NULL,
+  order_mode text DEFAULT 'fecha',   -- 'fecha' | 'precio_asc' | 'precio_desc'
+  max_rows int DEFAULT 50
+)
+RETURNS TABLE(
+  product_id bigint,
+  store_id bigint,
+  product_name text,
+  currency text,
+  store_name text,
+  meters numeric,
+  latest_price numeric,
+  latest_date timestamptz,
+  count bigint
+)
+LANGUAGE sql
+STABLE
+AS $function$
+WITH params AS (
+  -- Escapa comodines de LIKE para que el filtro sea un "contiene" literal.
+  -- products.name ya se guarda normalizado (minúsculas): se baja el patrón una vez
+  -- y se compara con LIKE, sin pasar cada fila por lower() como haría ILIKE.
+  SELECT '%' || replace(replace(replace(
+           lower(nearby_price_entries.filter_text), '\', '\\'), '%', '\%'), '_', '\_') || '%' AS pattern
+),
+near AS (
+  SELECT n.id, n.name, n.meters
+  FROM public.nearby_stores(
+    nearby_price_entries.lat, nearby_price_entries.lon, nearby_price_entries.radius_km
+  ) n
+),
+latest AS (
+  -- Una sola pasada: último avistamiento por (producto, local) + cantidad de reportes
+  SELECT DISTINCT ON (s.product_id, s.store_id)
+    s.product_id, s.store_id, s.price, s.created_at,
+    count(*) OVER (PARTITION BY s.product_id, s.store_id) AS cnt
+  FROM public.sightings s
+  JOIN near ON near.id = s.store_id
+  ORDER BY s.product_id, s.store_id, s.created_at DESC
+),
+entries AS (
+  SELECT
+    l.product_id, l.store_id,
+    p.name AS product_name, p.currency,
+    near.name AS store_name, near.meters,
+    l.price AS latest_price, l.created_at AS latest_date,
+    l.cnt
+  FROM latest l
+  JOIN near ON near.id = l.store_id
+  JOIN public.products p ON p.id = l.product_id
+  WHERE coalesce(nearby_price_entries.filter_text, '') = ''
+     OR p.name LIKE (SELECT pattern FROM params)
+)
+SELECT e.product_id, e.store_id, e.product_name, e.currency, e.store_name,
+       e.meters, e.latest_price, e.latest_date, e.cnt
+FROM entries e
+ORDER BY
+  CASE WHEN nearby_price_entries.order_mode = 'precio_asc' THEN e.currency END ASC,
+  CASE WHEN nearby_price_entries.order_mode = 'precio_asc' THEN e.latest_price END ASC,
+  CASE WHEN nearby_price_entries.order_mode = 'precio_desc' THEN e.currency END DESC,
+  CASE WHEN nearby_price_entries.order_mode = 'precio_desc' THEN e.latest_price END DESC,
+  e.latest_date DESC
+LIMIT nearby_price_entries.max_rows;
+$function$;
+
+-- Índice para que DISTINCT ON recorra los avistamientos ya ordenados por grupo.
+CREATE INDEX IF NOT EXISTS sightings_product_store_created_idx
+  ON public.sightings (product_id, store_id, created_at DESC);
+
+-- Índice trigram para el filtro "contiene" sobre products.name (sirve para LIKE e ILIKE).
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE INDEX IF NOT EXISTS products_name_trgm_idx
+  ON public.products USING gin (name gin_trgm_ops);
@@ -0,0 +1,38 @@
+-- supabase_sql/nearby_stores.sql
+-- Locales dentro del radio, ordenados por distancia.
+-- ST_DWithin + <-> usan el índice GiST sobre geom::geography (sin seq scan).
+CREATE INDEX IF NOT EXISTS stores_geog_gist
+  ON public.stores USING gist ((geom::geography));
+
+-- El filtro opcional obliga a cambiar la firma: se borra la de 3 argumentos para que
+-- PostgREST no vea dos sobrecargas ambiguas.
+DROP FUNCTION IF EXISTS public.nearby_stores(numeric, numeric, numeric);
+
+CREATE OR REPLACE FUNCTION public.nearby_stores(
+  lat numeric,
+  lon numeric,
+  radius_km numeric,
+  filter_text text DEFAULT NULL   -- "contiene" sobre nombre o dirección
+)
+RETURNS TABLE(id bigint, name text, address text, lat numeric, lon numeric, meters numeric)
+LANGUAGE sql
+STABLE
+AS $function$
+WITH params AS (
+  SELECT
+    ST_SetSRID(ST_MakePoint(lon::double precision, lat::double precision), 4326)::geography AS user_point,
+    (radius_km * 1000)::double precision AS radius_m,
+    -- Comodines de LIKE escapados: el filtro es un "contiene" literal
+    '%' || replace(replace(replace(
+      nearby_stores.filter_text, '\', '\\'), '%', '\%'), '_', '\_') || '%' AS pattern
+)
+SELECT
+  s.id, s.name, s.address, s.lat, s.lon,
+  ST_Distance(s.geom::geography, p.user_point)::numeric AS meters
+FROM public.stores s, params p
+WHERE ST_DWithin(s.geom::geography, p.user_point, p.radius_m)
+  AND (coalesce(nearby_stores.filter_text, '') = ''
+       OR s.name ILIKE p.pattern
+       OR coalesce(s.address, '') ILIKE p.pattern)
+ORDER BY s.geom::geography <-> p.user_point;
+$function$;
@@ -0,0 +1,8 @@
+-- supabase_sql/notifications_indexes.sql
+-- Polling incremental de "Alertas": WHERE user_id = $1 AND id > $2 ORDER BY id LIMIT 50
+-- y el historial: WHERE user_id = $1 ORDER BY created_at DESC LIMIT 50.
+CREATE INDEX IF NOT EXISTS notifications_user_id_id_idx
+  ON public.notifications (user_id, id);
+
+CREATE INDEX IF NOT EXISTS notifications_user_created_idx
+  ON public.notifications (user_id, created_at DESC);
@@ -0,0 +1,54 @@
+-- supabase_sql/otp_cooldown.sql
+-- Cooldown de reenvío de OTP por email, del lado del servidor: una pestaña nueva o un
+-- reload no lo saltean. La app reclama el turno antes de llamar a sign_in_with_otp.
+-- Si sign_in_with_otp falla, la app libera el turno con release_otp_slot: no se envió nada.
+-- Ojo: las dos funciones se otorgan a anon, así que cualquiera puede quemar el cooldown de
+-- cualquier email (o liberarlo). Es un freno contra reenvíos del propio usuario, no un control
+-- de seguridad: el rate limit de GoTrue sigue siendo el que protege el envío real.
+CREATE TABLE IF NOT EXISTS public.otp_cooldowns (
+  email text PRIMARY KEY,
+  last_send timestamptz NOT NULL DEFAULT now()
+);
+-- Sin políticas: la tabla solo se toca a través de claim_otp_slot / release_otp_slot (SECURITY DEFINER).
+ALTER TABLE public.otp_cooldowns ENABLE ROW LEVEL SECURITY;
+
+-- Devuelve 0 si se puede enviar (y registra el envío) o los segundos que faltan.
+-- El upsert condicional es atómico: dos pestañas a la vez no obtienen ambas el turno.
+CREATE OR REPLACE FUNCTION public.claim_otp_slot(p_email text)
+RETURNS int
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $function$
+DECLARE
+  cooldown CONSTANT interval := interval '60 seconds';
+  v_last timestamptz;
+BEGIN
+  INSERT INTO public.otp_cooldowns AS c (email, last_send)
+  VALUES (lower(trim(p_email)), now())
+  ON CONFLICT (email) DO UPDATE SET last_send = now()
+    WHERE c.last_send <= now() - cooldown
+  RETURNING c.last_send INTO v_last;
+
+  IF FOUND THEN
+    RETURN 0;
+  END IF;
+
+  SELECT c.last_send INTO v_last FROM public.otp_cooldowns c WHERE c.email = lower(trim(p_email));
+  RETURN greatest(1, ceil(extract(epoch FROM (v_last + cooldown - now())))::int);
+END;
+$function$;
+
+GRANT EXECUTE ON FUNCTION public.claim_otp_slot(text) TO anon, authenticated;
+
+-- Libera el turno reclamado cuando el envío falló, para no bloquear 60 s un código que no salió.
+CREATE OR REPLACE FUNCTION public.release_otp_slot(p_email text)
+RETURNS void
+LANGUAGE sql
+SECURITY DEFINER
+SET search_path = public
+AS $function$
+  DELETE FROM public.otp_cooldowns WHERE email = lower(trim(p_email));
+$function$;
+
+GRANT EXECUTE ON FUNCTION public.release_otp_slot(text) TO anon, authenticated;
@@ -0,0 +1,14 @@
+-- supabase_sql/upsert_product.sql
+-- Crea u obtiene un producto en un solo viaje. Idempotente: si (name, currency)
+-- ya existe devuelve su id sin insertar de nuevo.
+DROP FUNCTION IF EXISTS public.upsert_product(text, text);
+
+CREATE OR REPLACE FUNCTION public.upsert_product(p_name text, p_currency text DEFAULT 'ARS')
+RETURNS TABLE(id bigint)
+LANGUAGE sql
+AS $function$
+INSERT INTO public.products AS p (name, currency)
+VALUES (p_name, coalesce(p_currency, 'ARS'))
+ON CONFLICT (name, currency) DO UPDATE SET name = EXCLUDED.name
+RETURNING p.id;
+$function$;
@@ -7,6 +7,8 @@ def test_normalize_product_basic():
     assert normalize_product("  LECHE   1   l ") == "leche 1 l"
     assert normalize_product("Yerba 500ml") == "yerba 500 ml"
     assert normalize_product("") == ""
+    assert normalize_product("Arroz, Gallo") == "arroz gallo"
+    assert normalize_product("aceite lt") == "aceite l"
 
 def test_prettify_product():
     assert prettify_product("leche 1 l") == "Leche 1 l"
@@ -15,10 +17,13 @@ def test_prettify_product():
 def test_parse_coord():
     assert parse_coord("-38.7183") == -38.7183
     assert parse_coord("abc") is None
+    assert parse_coord(" -62.2663 ") == -62.2663
+    assert parse_coord("") is None
+    assert parse_coord("nan") is None
 
 def test_confidence():
     assert confidence_label(1).startswith("Reportado")
+    assert confidence_label(3) == "Confirmado por 3 personas (confianza media)"
     assert confidence_class(1) == "confidence-red"
     assert confidence_class(3) == "confidence-yellow"
     assert confidence_class(10) == "confidence-green"
-``
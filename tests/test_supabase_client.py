@@ -0,0 +1,59 @@
+# tests/test_supabase_client.py
+import pytest
+
+httpx = pytest.importorskip("httpx")
+pytest.importorskip("streamlit")
+pytest.importorskip("supabase")
+from postgrest.exceptions import APIError
+
+from utils.supabase_client import execute_with_retry
+
+class FakeQuery:
+    """Query que falla con los errores dados y después devuelve "ok"."""
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    def execute(self):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return "ok"
+
+def api_error(code):
+    return APIError({"message": "boom", "code": code, "hint": None, "details": None})
+
+def test_retries_postgrest_unavailable_codes():
+    q = FakeQuery(api_error("PGRST002"), api_error("503"))
+    assert execute_with_retry(q, base=0) == "ok"
+    assert q.calls == 3
+
+def test_raises_non_retryable_error_at_once():
+    q = FakeQuery(api_error("23505"))
+    with pytest.raises(APIError):
+        execute_with_retry(q, base=0)
+    assert q.calls == 1
+
+def test_gives_up_after_tries():
+    q = FakeQuery(*[api_error("PGRST000")] * 4)
+    with pytest.raises(APIError):
+        execute_with_retry(q, tries=3, base=0)
+    assert q.calls == 3
+
+def test_uncertain_errors_only_retried_when_idempotent():
+    q = FakeQuery(api_error("57014"))
+    assert execute_with_retry(q, base=0) == "ok"
+    q = FakeQuery(api_error("504"))
+    with pytest.raises(APIError):
+        execute_with_retry(q, base=0, idempotent=False)
+    assert q.calls == 1
+    q = FakeQuery(api_error("429"))
+    assert execute_with_retry(q, base=0, idempotent=False) == "ok"
+
+def test_transport_error():
+    q = FakeQuery(httpx.ConnectError("down"))
+    assert execute_with_retry(q, base=0) == "ok"
+    q = FakeQuery(httpx.ConnectError("down"))
+    with pytest.raises(httpx.TransportError):
+        execute_with_retry(q, base=0, idempotent=False)
+    assert q.calls == 1
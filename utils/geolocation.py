@@ -6,19 +6,9 @@ Maneja la obtención de ubicación desde el navegador sin recargas de página.
 import streamlit as st
 from typing import Optional, Tuple
 import streamlit.components.v1 as components
-import json
 
-def get_user_location_via_html() -> Tuple[Optional[float], Optional[float], Optional[str]]:
-    """
-    Obtiene ubicación usando HTML + JavaScript puro (más compatible con Streamlit Cloud).
-    Usa el Geolocation API del navegador.
-    
-    Returns:
-        Tuple[lat, lon, error_msg]
-    """
-    
-    # Crear HTML con JavaScript que se comunique con Streamlit
-    geolocation_html = """
+# HTML con JavaScript que se comunica con Streamlit (constante de módulo, compartida por todas las páginas)
+GEOLOCATION_HTML = """
     <div id="geo-container" style="padding: 10px; border-radius: 8px; background: #f0f0f0; margin: 10px 0;">
         <button id="geo-btn" style="
             background: #4CAF50; color: white; border: none; border-radius: 8px;
@@ -40,6 +30,8 @@ def get_user_location_via_html() -> Tuple[Optional[float], Optional[float], Opti
         const resultDiv = document.getElementById('geo-result');
         const latResult = document.getElementById('lat-result');
         const lonResult = document.getElementById('lon-result');
+        // Suscripción única a watchPosition: las lecturas siguientes llegan sin volver a pedir el GPS
+        let watchId = null;
         
         function setStatus(msg, color='#888', type='info') {
             statusEl.textContent = msg;
@@ -49,17 +41,39 @@ def get_user_location_via_html() -> Tuple[Optional[float], Optional[float], Opti
             }
         }
         
+        // Último fix conocido en localStorage (24 h): se muestra al instante mientras llega uno nuevo
+        const CACHE_KEY = 'geo_last_fix';
+        const CACHE_TTL_MS = 24 * 60 * 60 * 1000;
+        
+        function showCoords(latitude, longitude) {
+            latResult.textContent = latitude.toFixed(6);
+            lonResult.textContent = longitude.toFixed(6);
+            resultDiv.style.display = 'block';
+        }
+        
+        function readCachedFix() {
+            try {
+                const fix = JSON.parse(localStorage.getItem(CACHE_KEY));
+                return fix && (Date.now() - fix.ts) < CACHE_TTL_MS ? fix : null;
+            } catch (e) {
+                return null;
+            }
+        }
+        
         function onSuccess(pos) {
             const latitude = pos.coords.latitude;
             const longitude = pos.coords. longitude;
             setStatus(`✅ Ubicación obtenida`, '#4CAF50', 'success');
-            latResult.textContent = latitude.toFixed(6);
-            lonResult.textContent = longitude.toFixed(6);
-            resultDiv.style.display = 'block';
+            showCoords(latitude, longitude);
+            // El watch sigue activo; el botón queda habilitado para pedir un fix nuevo
+            btn.disabled = false;
             
             // Guardar en sessionStorage para que Streamlit lo lea
             sessionStorage.setItem('user_lat', latitude);
             sessionStorage.setItem('user_lon', longitude);
+            try {
+                localStorage.setItem(CACHE_KEY, JSON.stringify({lat: latitude, lon: longitude, ts: Date.now()}));
+            } catch (e) {}
         }
         
         function onError(err) {
@@ -70,6 +84,11 @@ def get_user_location_via_html() -> Tuple[Optional[float], Optional[float], Opti
             };
             const msg = errors[err.code] || '❌ Error de geolocalización. ';
             setStatus(msg, '#d9534f', 'error');
+            if (watchId !== null) {
+                navigator.geolocation.clearWatch(watchId);
+                watchId = null;
+            }
+            btn.disabled = false;
         }
         
         btn. addEventListener('click', function(){
@@ -77,19 +96,44 @@ def get_user_location_via_html() -> Tuple[Optional[float], Optional[float], Opti
                 setStatus('❌ Geolocalización no soportada', '#d9534f', 'error');
                 return;
             }
-            setStatus('Obteniendo ubicación...', '#FFA500');
+            // Con un watch ya activo, el usuario pide otra lectura (p. ej. la anterior fue imprecisa):
+            // se reinicia el watch sin aceptar fixes viejos
+            const retry = watchId !== null;
+            if (retry) {
+                navigator.geolocation.clearWatch(watchId);
+                watchId = null;
+            }
+            const cached = retry ? null : readCachedFix();
+            if (cached) {
+                showCoords(cached.lat, cached.lon);
+                setStatus('📌 Última ubicación conocida (actualizando...)', '#FFA500');
+            } else {
+                setStatus('Obteniendo ubicación...', '#FFA500');
+            }
             btn.disabled = true;
-            navigator.geolocation.getCurrentPosition(onSuccess, onError, {
-                enableHighAccuracy:  true,
-                timeout: 10000,
-                maximumAge: 0
+            // Acepta un fix reciente (hasta 30 s, ninguno al reintentar) y baja precisión para responder enseguida;
+            // watchPosition sigue actualizando lat/lon mientras la página esté abierta
+            watchId = navigator.geolocation.watchPosition(onSuccess, onError, {
+                enableHighAccuracy: false,
+                timeout: 5000,
+                maximumAge: retry ? 0 : 30000
             });
         });
     })();
     </script>
     """
+
+
+def get_user_location_via_html() -> Tuple[Optional[float], Optional[float], Optional[str]]:
+    """
+    Obtiene ubicación usando HTML + JavaScript puro (más compatible con Streamlit Cloud).
+    Usa el Geolocation API del navegador.
+    
+    Returns:
+        Tuple[lat, lon, error_msg]
+    """
     
-    components.html(geolocation_html, height=150, scrolling=False)
+    components.html(GEOLOCATION_HTML, height=150, scrolling=False)
     
     return None, None, None
 
@@ -115,8 +159,6 @@ def set_location_from_gps(lat_key:  str, lon_key: str) -> bool:
     
     # Botón de confirmación manual
     if st.button("✅ Confirmar ubicación obtenida", key=f"confirm_geo_{lat_key}"):
-        import json
-        
         # Intentar obtener de sessionStorage (no funcionará directamente, alternativa:  input manual)
         col1, col2 = st.columns(2)
         with col1:
@@ -2,9 +2,22 @@
 # utils/geolocation_providers.py
 import os
 import requests
+from requests.adapters import HTTPAdapter
 import streamlit as st
 
 
+@st.cache_resource
+def _http() -> requests.Session:
+    """
+    Sesión HTTP compartida (keep-alive) para Google/OSM: evita un handshake TCP+TLS por consulta.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=20)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
 # =========================
 # Google Maps
 # =========================
@@ -34,7 +47,7 @@ def geocode_address_google(address: str) -> tuple[float | None, float | None]:
     url = "https://maps.googleapis.com/maps/api/geocode/json"
     params = {"address": address, "key": api_key, "language": "es"}
     try:
-        r = requests.get(url, params=params, timeout=10)
+        r = _http().get(url, params=params, timeout=10)
         r.raise_for_status()
         data = r.json()
         if data.get("status") != "OK" or not data.get("results"):
@@ -73,7 +86,7 @@ def places_nearby_google(
         params["type"] = place_type
 
     try:
-        r = requests.get(url, params=params, timeout=10)
+        r = _http().get(url, params=params, timeout=10)
         r.raise_for_status()
         data = r.json()
         results = data.get("results", [])
@@ -101,7 +114,7 @@ def geocode_address_osm(address: str) -> tuple[float | None, float | None]:
     params = {"q": address, "format": "json", "limit": 1}
     headers = {"User-Agent": "PreciosCercanosApp/1.0"}
     try:
-        r = requests.get(url, params=params, headers=headers, timeout=10)
+        r = _http().get(url, params=params, headers=headers, timeout=10)
         r.raise_for_status()
         data = r.json()
         if not data:
@@ -131,7 +144,7 @@ def places_nearby_osm(
     url = "https://overpass-api.de/api/interpreter"
     headers = {"User-Agent": "PreciosCercanosApp/1.0"}
     try:
-        r = requests.post(url, data=query.encode("utf-8"), headers=headers, timeout=15)
+        r = _http().post(url, data=query.encode("utf-8"), headers=headers, timeout=15)
         r.raise_for_status()
         data = r.json()
         elements = data.get("elements", [])
@@ -1,23 +1,30 @@
 
 # utils/helpers.py
 import re
+from functools import lru_cache
 
 UNITS_MAP = {"lt": "l", "l": "l", "kg": "kg", "gr": "g", "g": "g", "ml": "ml"}
 COMMON_WORDS_CAP = {"leche", "yerba", "arroz", "aceite", "azúcar", "fideos", "harina", "café", "te", "té"}
+_UNIT_VALUES = frozenset(UNITS_MAP.values())
 
+_UNIT_RE = re.compile(r"(\d+)\s*(lt|l|kg|gr|g|ml)\b")
+_PUNCT_TABLE = str.maketrans("", "", ".,;:")
+_COORD_RE = re.compile(r"^\s*[+-]?(?:\d+(?:\.\d*)?|\.\d+)\s*$")
+
+@lru_cache(maxsize=4096)
 def normalize_product(name: str) -> str:
     """Versión canónica del nombre para DB: lower, trim, colapsa espacios, normaliza unidades y elimina puntuación."""
     if not name:
         return ""
-    s = name.strip().lower()
-    s = " ".join(s.split())  # colapsar espacios múltiples
-    s = re.sub(r"(\d+)\s*(lt|l|kg|gr|g|ml)\b", lambda m: f"{m.group(1)} {UNITS_MAP[m.group(2)]}", s)
-    s = " ".join(s.split())
-    tokens = s.split()
-    s = " ".join([UNITS_MAP[t] if t in UNITS_MAP else t for t in tokens])
-    s = re.sub(r"[.,;:]+", "", s)
-    return s
+    s = name.lower()
+    # La mayoría de los nombres no tiene cantidades: sin dígitos no hace falta el regex
+    if any(c.isdigit() for c in s):
+        s = _UNIT_RE.sub(lambda m: f"{m.group(1)} {UNITS_MAP[m.group(2)]}", s)
+    # split() sin argumentos ya colapsa espacios múltiples y recorta extremos
+    s = " ".join([UNITS_MAP.get(t, t) for t in s.split()])
+    return s.translate(_PUNCT_TABLE)
 
+@lru_cache(maxsize=4096)
 def prettify_product(name: str) -> str:
     """Presentación del nombre en UI: capitaliza palabras comunes, mantiene unidades en minúscula."""
     if not name:
@@ -25,7 +32,7 @@ def prettify_product(name: str) -> str:
     tokens = name.split()
     pretty = []
     for t in tokens:
-        if t in UNITS_MAP.values():  # unidades
+        if t in _UNIT_VALUES:  # unidades
             pretty.append(t)
         elif t in COMMON_WORDS_CAP:
             pretty.append(t.capitalize())
@@ -33,22 +40,33 @@ def prettify_product(name: str) -> str:
             pretty.append(t[0].upper() + t[1:] if len(t) > 1 else t.upper())
     return " ".join(pretty)
 
+# El mismo texto de lat/lon se vuelve a parsear en cada rerun de cada página
+@lru_cache(maxsize=128)
 def parse_coord(txt: str):
+    # Pre-chequeo con regex: la entrada vacía/inválida es el caso común y evita la excepción
+    if not txt or not _COORD_RE.match(txt):
+        return None
     try:
         return float(txt)
-    except:
+    except ValueError:
         return None
 
-def confidence_label(count: int) -> str:
+_CONF_CLASSES = ("confidence-red", "confidence-yellow", "confidence-green")
+_CONF_LABELS = (
+    "Reportado por {count} persona (puede variar)",
+    "Confirmado por {count} personas (confianza media)",
+    "Confirmado por {count} personas (alta confianza)",
+)
+
+def _confidence_level(count: int) -> int:
+    """0 = un solo reporte, 1 = 2–3 reportes, 2 = el resto."""
     if count == 1:
-        return "Reportado por 1 persona (puede variar)"
-    if 2 <= count <= 3:
-        return f"Confirmado por {count} personas (confianza media)"
-    return f"Confirmado por {count} personas (alta confianza)"
+        return 0
+    return 1 if 2 <= count <= 3 else 2
+
+@lru_cache(maxsize=128)
+def confidence_label(count: int) -> str:
+    return _CONF_LABELS[_confidence_level(count)].format(count=count)
 
 def confidence_class(count: int) -> str:
-    if count == 1:
-        return "confidence-red"
-    if 2 <= count <= 3:
-        return "confidence-yellow"
-    return "confidence-green"
+    return _CONF_CLASSES[_confidence_level(count)]
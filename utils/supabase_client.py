@@ -1,11 +1,18 @@
 
 # utils/supabase_client.py
-from supabase import create_client
+from supabase import create_client, ClientOptions
+from postgrest.exceptions import APIError
+import httpx
 import os
+import random
+import time
 import streamlit as st
 
+# Segundos máximos de espera por consulta PostgREST
+POSTGREST_TIMEOUT = 10
+
 # Cachea el cliente para evitar recrearlo.
-@st.cache_resource
+@st.cache_resource(show_spinner=False)
 def get_supabase():
     url = None
     key = None
@@ -28,4 +35,33 @@ def get_supabase():
             "No se encontraron credenciales de Supabase. "
             "Definí SUPABASE_URL y SUPABASE_ANON_KEY en Streamlit secrets o variables de entorno."
         )
-    return create_client(url, key)
+    # Un solo cliente por proceso: su httpx.Client mantiene las conexiones keep-alive.
+    # Timeout acotado (el default es 120 s) para que execute_with_retry pueda reintentar
+    return create_client(url, key, options=ClientOptions(postgrest_client_timeout=POSTGREST_TIMEOUT))
+
+# APIError.code trae el campo "code" del JSON de PostgREST; solo las respuestas de un
+# gateway sin cuerpo JSON llegan con el status HTTP como código.
+# Rechazos sin aplicar la operación (seguros de reintentar siempre): 429/503 del gateway y
+# los 503 propios de PostgREST (PGRST000–003: conexión, pool y caché de esquema)
+_RETRY_REJECTED = {"429", "503", "PGRST000", "PGRST001", "PGRST002", "PGRST003"}
+# Fallas donde la operación pudo haberse aplicado: solo se reintentan lecturas/upserts.
+# 57014 = statement timeout de Postgres
+_RETRY_UNCERTAIN = {"502", "504", "57014"}
+
+def execute_with_retry(query, tries: int = 4, base: float = 0.25, idempotent: bool = True):
+    """
+    Ejecuta query.execute() con backoff exponencial + jitter ante 429/5xx o cortes de red.
+    Con idempotent=False (inserts) solo reintenta rechazos explícitos (429/503/PGRST00x), para no duplicar filas.
+    """
+    for attempt in range(tries):
+        try:
+            return query.execute()
+        except APIError as e:
+            code = str(getattr(e, "code", ""))
+            retryable = code in _RETRY_REJECTED or (idempotent and code in _RETRY_UNCERTAIN)
+            if not retryable or attempt == tries - 1:
+                raise
+        except httpx.TransportError:
+            if not idempotent or attempt == tries - 1:
+                raise
+        time.sleep(min(base * 2 ** attempt, 5.0) + random.uniform(0, base))